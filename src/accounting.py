@@ -0,0 +1,64 @@
+import sys
+import asyncio
+import numpy as np
+from typing import Callable
+
+
+def nbytes(item) -> int:
+    """キューの要素などが保持しているおおよそのバイト数を返す
+
+    Args:
+        item: np.ndarray, bytes, str またはそれらのタプル・リスト
+
+    Returns:
+        int: バイト数
+    """
+    if isinstance(item, np.ndarray):
+        return item.nbytes
+    if isinstance(item, (bytes, bytearray)):
+        return len(item)
+    if isinstance(item, str):
+        return sys.getsizeof(item)
+    if isinstance(item, (tuple, list)):
+        return sum(nbytes(x) for x in item)
+    return 0
+
+
+def format_bytes(n: int) -> str:
+    """バイト数を読みやすい単位に変換"""
+    for unit in ["B", "KB", "MB"]:
+        if n < 1024:
+            return f"{n:.0f}{unit}"
+        n /= 1024
+    return f"{n:.1f}GB"
+
+
+class SizedQueue(asyncio.Queue):
+    """保持しているデータのバイト数を数える asyncio.Queue"""
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self.nbytes = 0
+
+    def _put(self, item):
+        self.nbytes += nbytes(item)
+        super()._put(item)
+
+    def _get(self):
+        item = super()._get()
+        self.nbytes -= nbytes(item)
+        return item
+
+
+async def memory_report_worker(interval: float, stages: dict[str, Callable[[], int]]):
+    """各段階で保持しているバイト数を定期的に表示するワーカー
+
+    Args:
+        interval (float): 表示間隔（秒）
+        stages (dict[str, Callable[[], int]]): 段階名とバイト数を返す関数
+    """
+    while True:
+        await asyncio.sleep(interval)
+        usage = {name: f() for name, f in stages.items()}
+        report = " ".join(f"{name}={format_bytes(n)}" for name, n in usage.items())
+        print(f"memory: {report} total={format_bytes(sum(usage.values()))}", flush=True)
@@ -1,4 +1,5 @@
 import queue
+from collections import Counter
 from abc import ABC, abstractmethod
 
 
@@ -6,6 +7,7 @@ class SpeechToText(ABC):
     def __init__(self):
         self.running = True
         self.q = queue.Queue()
+        self.stats = Counter()  # どの経路で認識したかの回数
 
     def pause(self):
         self.running = False  # 音声入力を無効化
@@ -26,6 +28,20 @@ class SpeechToText(ABC):
             print(status, flush=True)
         self.q.put(bytes(indata))
 
+    def nbytes(self) -> int:
+        """保持している音声データのバイト数"""
+        return sum(len(data) for data in list(self.q.queue))
+
+    def print_stats(self):
+        """認識経路の統計を表示"""
+        total = sum(self.stats.values())
+        if not total:
+            return
+        report = " ".join(
+            f"{path}={n}({n / total:.0%})" for path, n in self.stats.most_common()
+        )
+        print(f"asr: {report}", flush=True)
+
     @abstractmethod
     def audio_input(self) -> str:
         pass
@@ -0,0 +1,59 @@
+import os
+import sys
+
+
+def _cpu_times() -> tuple[float, float] | None:
+    """システム全体のCPU時間を (アイドル時間, 合計時間) で返す（取得できなければNone）"""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        idle, kernel, user = (
+            wintypes.FILETIME(),
+            wintypes.FILETIME(),
+            wintypes.FILETIME(),
+        )
+        if not ctypes.windll.kernel32.GetSystemTimes(
+            ctypes.byref(idle), ctypes.byref(kernel), ctypes.byref(user)
+        ):
+            return None
+
+        def to_int(t):
+            return (t.dwHighDateTime << 32) | t.dwLowDateTime
+
+        # kernel にはアイドル時間も含まれる
+        return to_int(idle), to_int(kernel) + to_int(user)
+    if os.path.exists("/proc/stat"):
+        with open("/proc/stat") as f:
+            # cpu user nice system idle iowait irq softirq steal ...
+            values = [int(v) for v in f.readline().split()[1:9]]
+        return values[3] + values[4], sum(values)
+    return None
+
+
+class CPUMonitor:
+    """前回 mark してからのシステム全体のCPU使用率を測る
+
+    Windows と Linux ではCPU時間から直近の使用率を求め、
+    それ以外ではコアあたりのロードアベレージで代用する。
+    """
+
+    def __init__(self):
+        self.mark()
+
+    def mark(self):
+        """計測区間の開始点を記録"""
+        self.last = _cpu_times()
+
+    def usage(self) -> float:
+        """計測区間のCPU使用率（0〜1）"""
+        now = _cpu_times()
+        if now is None or self.last is None:
+            if hasattr(os, "getloadavg"):
+                return os.getloadavg()[0] / (os.cpu_count() or 1)
+            return 0.0
+        idle = now[0] - self.last[0]
+        total = now[1] - self.last[1]
+        if total <= 0:
+            return 0.0
+        return 1.0 - idle / total
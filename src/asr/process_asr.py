@@ -0,0 +1,227 @@
+import atexit
+import queue
+import multiprocessing as mp
+from collections import Counter
+from multiprocessing import connection
+from multiprocessing.shared_memory import SharedMemory
+from .base import SpeechToText
+
+SAMPLE_RATE = 16000
+FRAME_BYTES = 640  # 20ms分（320サンプル × 16bit）
+
+
+def _capture_worker(
+    ring_name: str,
+    slot_bytes: int,
+    num_slots: int,
+    vad_config: dict,
+    listening,
+    active,
+    generation,
+    free_slots,
+    ring_bytes,
+    capture_bytes,
+    utterance_conn: connection.Connection,
+):
+    """マイク入力をVADで発話に区切り、共有メモリのリングバッファに書き込むプロセス"""
+    import sounddevice as sd
+    from .vad import VADSegmenter
+
+    ring = SharedMemory(name=ring_name)
+    segmenter = VADSegmenter(SAMPLE_RATE, **vad_config)
+    frames = queue.Queue()
+
+    def callback(indata, frame_count, time_info, status):
+        if status:
+            print(status, flush=True)
+        frames.put(bytes(indata))
+
+    slot = 0
+    with sd.RawInputStream(
+        samplerate=SAMPLE_RATE,
+        blocksize=FRAME_BYTES // 2,
+        dtype="int16",
+        channels=1,
+        callback=callback,
+    ):
+        while True:
+            data = frames.get()
+            # audio_input 中以外の音声は捨てる
+            if not listening.is_set():
+                segmenter.reset()
+                continue
+            audio_bytes = segmenter.feed(data, active.is_set())
+            capture_bytes.value = segmenter.nbytes()
+            if audio_bytes is None:
+                continue
+            # 空きスロットを待ってから書き込み、位置だけをパイプで送る
+            free_slots.acquire()
+            offset = slot * slot_bytes
+            ring.buf[offset : offset + len(audio_bytes)] = audio_bytes
+            with ring_bytes.get_lock():
+                ring_bytes.value += len(audio_bytes)
+            # どの audio_input 中の発話かを番号で付けておく
+            utterance_conn.send(
+                (generation.value, slot, len(audio_bytes), segmenter.forced)
+            )
+            slot = (slot + 1) % num_slots
+
+
+def _transcribe_worker(
+    ring_name: str,
+    slot_bytes: int,
+    whisper_config: dict,
+    vad_config: dict,
+    free_slots,
+    ring_bytes,
+    utterance_conn: connection.Connection,
+    event_conn: connection.Connection,
+):
+    """リングバッファの発話を認識し、結果をパイプで返すプロセス"""
+    from .whisper_asr import WhisperASR
+
+    ring = SharedMemory(name=ring_name)
+    try:
+        asr = WhisperASR(**whisper_config, **vad_config)
+    except Exception as e:
+        event_conn.send(("error", None, str(e)))
+        return
+    event_conn.send(("ready", None, None))
+    while True:
+        gen, slot, size, forced = utterance_conn.recv()
+        offset = slot * slot_bytes
+        audio_bytes = bytes(ring.buf[offset : offset + size])
+        free_slots.release()
+        with ring_bytes.get_lock():
+            ring_bytes.value -= size
+        text = asr.transcribe(audio_bytes)
+        event_conn.send(("text", gen, (text, forced, dict(asr.stats))))
+
+
+class ProcessASR(SpeechToText):
+    def __init__(self, whisper: dict, webrtcvad: dict, num_slots: int = 4):
+        """音声取得・VAD・Whisperでの認識を別プロセスで行う音声認識を初期化
+
+        発話の音声は共有メモリのリングバッファで受け渡し、認識結果はパイプで受け取る。
+
+        Args:
+            whisper (dict): WhisperASR のモデル設定
+            webrtcvad (dict): VADの設定
+            num_slots (int): リングバッファに保持できる発話数
+        """
+        super().__init__()
+        # 1スロットに1発話（プリバッファ込みの最大長）を入れる
+        slot_bytes = (
+            webrtcvad["max_utterance_frames"] + webrtcvad["pre_buffer_frames"]
+        ) * FRAME_BYTES
+        self.ring = SharedMemory(create=True, size=slot_bytes * num_slots)
+
+        # Windows でも同じ挙動になるよう spawn で起動する
+        ctx = mp.get_context("spawn")
+        self.listening = ctx.Event()  # audio_input 中だけセット
+        self.active = ctx.Event()  # pause/resume に対応
+        self.active.set()
+        self.generation = ctx.Value("q", 0)  # audio_input を呼ぶたびに増やす番号
+        self.ring_bytes = ctx.Value("q", 0)  # リングバッファ内の発話のバイト数
+        self.capture_bytes = ctx.Value("q", 0)  # 取得プロセスのVADバッファのバイト数
+        free_slots = ctx.Semaphore(num_slots)
+        utterance_recv, utterance_send = ctx.Pipe(duplex=False)
+        self.event_conn, event_send = ctx.Pipe(duplex=False)
+
+        self.capture = ctx.Process(
+            target=_capture_worker,
+            args=(
+                self.ring.name,
+                slot_bytes,
+                num_slots,
+                webrtcvad,
+                self.listening,
+                self.active,
+                self.generation,
+                free_slots,
+                self.ring_bytes,
+                self.capture_bytes,
+                utterance_send,
+            ),
+            daemon=True,
+        )
+        self.transcriber = ctx.Process(
+            target=_transcribe_worker,
+            args=(
+                self.ring.name,
+                slot_bytes,
+                whisper,
+                webrtcvad,
+                free_slots,
+                self.ring_bytes,
+                utterance_recv,
+                event_send,
+            ),
+            daemon=True,
+        )
+        self.transcriber.start()
+        self.capture.start()
+        atexit.register(self.close)
+        # モデルのロード完了を待つ
+        self._recv()
+
+    def pause(self):
+        super().pause()
+        self.active.clear()
+
+    def resume(self):
+        super().resume()
+        self.active.set()
+
+    def nbytes(self) -> int:
+        """別プロセスとリングバッファで保持している音声データのバイト数"""
+        return self.ring_bytes.value + self.capture_bytes.value
+
+    def _recv(self) -> tuple[str, int, object]:
+        """認識プロセスからのイベントを受け取る"""
+        while not self.event_conn.poll(1.0):
+            if not (self.capture.is_alive() and self.transcriber.is_alive()):
+                raise RuntimeError("音声認識プロセスが終了しました")
+        kind, gen, value = self.event_conn.recv()
+        if kind == "error":
+            raise RuntimeError(value)
+        return kind, gen, value
+
+    def audio_input(self) -> str:
+        """マイク入力から音声を認識し、テキストを返す
+
+        Returns:
+            str: 認識したテキスト
+        """
+        # 前回までの audio_input 中の発話の認識結果は、届いても捨てる
+        with self.generation.get_lock():
+            self.generation.value += 1
+            current = self.generation.value
+        # 長さの上限で区切られた発話は、発話が終わるまでつなげて返す
+        texts = []
+        self.listening.set()
+        try:
+            while True:
+                kind, gen, value = self._recv()
+                if kind != "text":
+                    continue
+                text, forced, stats = value
+                self.stats = Counter(stats)
+                if gen != current:
+                    continue
+                if text:
+                    texts.append(text)
+                if texts and not forced:
+                    return " ".join(texts)
+        finally:
+            self.listening.clear()
+
+    def close(self):
+        """プロセスを停止し、共有メモリを解放"""
+        for process in [self.capture, self.transcriber]:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.ring.close()
+        self.ring.unlink()
+        atexit.unregister(self.close)
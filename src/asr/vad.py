@@ -0,0 +1,95 @@
+import webrtcvad
+from collections import deque
+
+
+class VADSegmenter:
+    """webrtcvadで20msごとの音声フレームを発話単位に区切る"""
+
+    def __init__(
+        self,
+        sample_rate: int,
+        sensitivity: int,
+        hangover_threshold: int,
+        pre_buffer_frames: int,
+        max_utterance_frames: int,
+    ):
+        """
+        Args:
+            sample_rate (int): サンプリングレート
+            sensitivity (int): VADの感度（0〜3、3が最も厳しい）
+            hangover_threshold (int): 発話終了と判断する無音フレーム数
+            pre_buffer_frames (int): 発話開始直前に保持しておくフレーム数
+            max_utterance_frames (int): 1発話の最大フレーム数（超えたら強制的に区切る）
+        """
+        self.vad = webrtcvad.Vad()
+        self.vad.set_mode(sensitivity)
+        self.sample_rate = sample_rate
+        self.hangover_threshold = hangover_threshold
+        self.pre_buffer_frames = pre_buffer_frames
+        self.max_utterance_frames = max_utterance_frames
+        self.reset()
+
+    def reset(self):
+        """バッファと状態をリセット"""
+        self.buffer = []  # 音声データを蓄積するバッファ
+        self.is_speaking = False  # 発話中かどうかのフラグ
+        # ハングオーバー処理用の無音カウンター
+        self.silence_counter = 0
+        # プリバッファ：直前の数フレームを保持
+        self.pre_buffer = deque(maxlen=self.pre_buffer_frames)
+        # 直前に返した発話が長さの上限で区切ったものか（続きがある）
+        self.forced = False
+
+    def nbytes(self) -> int:
+        """保持している音声データのバイト数"""
+        # 別スレッドから呼ばれるので、変更途中に走査しないよう先にコピーする
+        return sum(len(data) for data in list(self.buffer)) + sum(
+            len(data) for data in list(self.pre_buffer)
+        )
+
+    def feed(self, data: bytes, active: bool = True) -> bytes | None:
+        """フレームを追加し、発話が区切れたらその音声データを返す
+
+        Args:
+            data (bytes): 20ms分の16bitモノラル音声データ
+            active (bool): Falseならプリバッファに溜めるだけで判定しない
+
+        Returns:
+            bytes | None: 区切れた発話の音声データ（発話途中ならNone）
+        """
+        # まずは常にプリバッファに追加
+        self.pre_buffer.append(data)
+        if not active:
+            return None
+        # VADで音声区間を検出
+        is_speech = self.vad.is_speech(data, sample_rate=self.sample_rate)
+
+        if is_speech:
+            # 発話開始直前なら、プリバッファの内容を先にコピーする
+            if not self.is_speaking:
+                self.buffer.extend(self.pre_buffer)
+                self.is_speaking = True
+            self.buffer.append(data)
+            self.silence_counter = 0  # 音声が検出されたので無音カウンターをリセット
+        elif self.is_speaking:
+            self.silence_counter += 1
+            self.buffer.append(data)
+        else:
+            return None
+
+        # 一定数の無音フレームが連続した場合、発話終了と判断
+        # 発話が長すぎる場合もバッファを溜め続けないよう強制的に区切る
+        if (
+            self.silence_counter >= self.hangover_threshold
+            or len(self.buffer) >= self.max_utterance_frames
+        ):
+            audio_bytes = b"".join(self.buffer)
+            self.forced = self.silence_counter < self.hangover_threshold
+            if self.forced:
+                # 続きの発話に同じ音声が重複して入らないよう、プリバッファも捨てる
+                self.pre_buffer.clear()
+            self.buffer = []
+            self.is_speaking = False
+            self.silence_counter = 0
+            return audio_bytes
+        return None
@@ -1,10 +1,10 @@
 import sounddevice as sd
 import numpy as np
-import webrtcvad
 from faster_whisper import WhisperModel
 import wave
-from collections import deque
 from .base import SpeechToText
+from .vad import VADSegmenter
+from .cpu import CPUMonitor
 
 
 class WhisperASR(SpeechToText):
@@ -13,28 +13,47 @@ class WhisperASR(SpeechToText):
         model_name: str,
         compute_type: str,
         vad_filter: bool,
+        # モデル切り替え設定
+        fast_model_name: str,
+        short_seconds: float,
+        logprob_threshold: float,
+        load_threshold: float,
         # vad設定
         sensitivity: int,
         hangover_threshold: str,
         pre_buffer_frames: str,
+        max_utterance_frames: int,
     ):
         """音声認識モデルを初期化
 
         Args:
             model_name (str): Faster-Whisperモデル名（例: "small", "turbo"）
+            fast_model_name (str): 短い発話や高負荷時に使う軽量モデル名（Noneで無効）
+            short_seconds (float): この秒数以下の発話は軽量モデルで認識する
+            logprob_threshold (float): 軽量モデルの avg_logprob がこれ未満なら通常モデルで再認識する
+            load_threshold (float): 前回の認識以降のCPU使用率（0〜1）がこれ以上なら軽量モデルだけを使う
+            max_utterance_frames (int): 1発話の最大フレーム数（超えたら強制的に認識する）
         """
         super().__init__()
+        self.sample_rate = 16000  # サンプリングレート
         # VADの初期化
-        self.vad = webrtcvad.Vad()
-        self.vad.set_mode(sensitivity)  # 感度設定（0〜3、3が最も厳しい）
+        self.segmenter = VADSegmenter(
+            self.sample_rate,
+            sensitivity,
+            hangover_threshold,
+            pre_buffer_frames,
+            max_utterance_frames,
+        )
         # Whisperモデルのロード
         self.model = WhisperModel(model_name, compute_type=compute_type)
-        self.buffer = []  # 音声データを蓄積するバッファ
-        self.is_speaking = False  # 発話中かどうかのフラグ
-        self.sample_rate = 16000  # サンプリングレート
+        self.fast_model = None
+        if fast_model_name:
+            self.fast_model = WhisperModel(fast_model_name, compute_type=compute_type)
+        self.short_seconds = short_seconds
+        self.logprob_threshold = logprob_threshold
+        self.load_threshold = load_threshold
+        self.cpu = CPUMonitor()
         self.vad_filter = vad_filter
-        self.hangover_threshold = hangover_threshold
-        self.pre_buffer_frames = pre_buffer_frames
 
     def save_wav(self, file_name: str, audio_data: bytes):
         """音声データをWAVファイルとして保存
@@ -49,16 +68,73 @@ class WhisperASR(SpeechToText):
             wf.setframerate(self.sample_rate)
             wf.writeframes(audio_data)
 
+    def nbytes(self) -> int:
+        """保持している音声データのバイト数"""
+        return super().nbytes() + self.segmenter.nbytes()
+
+    def transcribe(self, audio_bytes: bytes) -> str:
+        """音声データを認識してテキストを返す
+
+        Args:
+            audio_bytes (bytes): 16bitモノラルの音声データ
+
+        Returns:
+            str: 認識したテキスト
+        """
+        # WAVファイルに保存（デバッグ用）
+        # self.save_wav("temp.wav", audio_bytes)
+
+        # 音声データをfloat32のNumPyアレイに変換
+        audio = np.frombuffer(audio_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+        if self.fast_model is None:
+            self.stats["large"] += 1
+            text, _ = self._run(self.model, audio)
+            return text
+
+        duration = len(audio) / self.sample_rate
+        # Whisper自身の負荷を含めないよう、前回の認識終了からの使用率で判断する
+        busy = self.cpu.usage() >= self.load_threshold
+        try:
+            if duration > self.short_seconds and not busy:
+                self.stats["large"] += 1
+                text, _ = self._run(self.model, audio)
+                return text
+
+            # 短い発話や高負荷時は軽量モデルで認識
+            text, logprob = self._run(self.fast_model, audio)
+            if not text or (logprob < self.logprob_threshold and not busy):
+                # 聞き取れなかったか自信がなければ通常モデルで認識し直す
+                self.stats["rerun"] += 1
+                text, _ = self._run(self.model, audio)
+            elif duration > self.short_seconds:
+                # 本来は通常モデルだが高負荷のため軽量モデルで済ませた
+                self.stats["busy"] += 1
+            else:
+                self.stats["fast"] += 1
+            return text
+        finally:
+            self.cpu.mark()
+
+    def _run(self, model: WhisperModel, audio: np.ndarray) -> tuple[str, float]:
+        """Whisperで音声を認識し、テキストと平均対数確率を返す"""
+        segments, _ = model.transcribe(audio, language="ja", vad_filter=self.vad_filter)
+        segments = list(segments)
+        # 認識結果をテキストとして結合
+        text = " ".join([segment.text for segment in segments]).strip()
+        logprob = (
+            np.mean([segment.avg_logprob for segment in segments]) if segments else 0.0
+        )
+        return text, logprob
+
     def audio_input(self) -> str:
         """マイク入力から音声を認識し、テキストを返す
 
         Returns:
             str: 認識したテキスト
         """
-        # ハングオーバー処理用の無音カウンター
-        silence_counter = 0
-        # プリバッファ：直前の数フレームを保持
-        pre_buffer = deque(maxlen=self.pre_buffer_frames)
+        self.segmenter.reset()
+        # 長さの上限で区切られた発話は、発話が終わるまでつなげて返す
+        texts = []
 
         with sd.RawInputStream(
             samplerate=self.sample_rate,  # サンプリングレート: 16kHz
@@ -70,49 +146,12 @@ class WhisperASR(SpeechToText):
             while True:
                 # キューから音声データを取得（20ms分のバイトデータ）
                 data = self.q.get()
-                # まずは常にプリバッファに追加
-                pre_buffer.append(data)
-                if not self.running:
+                # VADで発話を区切る
+                audio_bytes = self.segmenter.feed(data, self.running)
+                if audio_bytes is None:
                     continue
-                # VADで音声区間を検出
-                is_speech = self.vad.is_speech(data, sample_rate=self.sample_rate)
-
-                if is_speech:
-                    # 発話開始直前なら、プリバッファの内容を先にコピーする
-                    if not self.is_speaking:
-                        self.buffer.extend(pre_buffer)
-                        self.is_speaking = True
-                    self.buffer.append(data)
-                    silence_counter = 0  # 音声が検出されたので無音カウンターをリセット
-                elif self.is_speaking:
-                    silence_counter += 1
-                    self.buffer.append(data)
-                    # 一定数の無音フレームが連続した場合、発話終了と判断
-                    if silence_counter >= self.hangover_threshold:
-                        # バッファ内の音声データを結合
-                        audio_bytes = b"".join(self.buffer)
-
-                        # WAVファイルに保存（デバッグ用）
-                        # self.save_wav("temp.wav", audio_bytes)
-
-                        # 音声データをfloat32のNumPyアレイに変換
-                        audio = (
-                            np.frombuffer(audio_bytes, dtype=np.int16).astype(
-                                np.float32
-                            )
-                            / 32768.0
-                        )
-                        # Whisperで音声を認識
-                        segments, _ = self.model.transcribe(
-                            audio, language="ja", vad_filter=self.vad_filter
-                        )
-                        # 認識結果をテキストとして結合
-                        text = " ".join([segment.text for segment in segments]).strip()
-
-                        # バッファと状態をリセット
-                        self.buffer = []
-                        self.is_speaking = False
-                        silence_counter = 0
-
-                        if text:
-                            return text
+                text = self.transcribe(audio_bytes)
+                if text:
+                    texts.append(text)
+                if texts and not self.segmenter.forced:
+                    return " ".join(texts)
@@ -1,4 +1,6 @@
+import sys
 import asyncio
+import numpy as np
 import sounddevice as sd
 from langchain_ollama import ChatOllama
 from invoke.config import Config
@@ -7,19 +9,35 @@ from .asr.base import SpeechToText
 from .tts.voicevox import VoiceVox
 from .tts.coeiroink import CoeiroInk
 from .tts.aivisspeech import AivisSpeech
+from .pipeline import TurnPipeline
+from .accounting import SizedQueue, memory_report_worker
+from .session import SessionLog
 
 
 async def playback_worker(queue: asyncio.Queue, asr: SpeechToText):
     """再生キューから順次オーディオデータを取り出して再生するワーカー"""
     while True:
         data, sr = await queue.get()
+        if data is None:
+            # ターン終了の目印（sr に再生完了時のコールバックが入っている）
+            try:
+                sr()
+            finally:
+                queue.task_done()
+            continue
         if asr is not None:
             asr.pause()  # マイクをOFFにする
-        sd.play(data, sr)
-        await asyncio.to_thread(sd.wait)
-        if asr is not None:
-            asr.resume()  # 再生終了後にマイクをONにする
-        queue.task_done()
+        try:
+            # int16 で保持している音声を再生直前に float32 へ変換
+            sd.play(data.astype(np.float32) / 32768.0, sr)
+            await asyncio.to_thread(sd.wait)
+        except Exception as e:
+            # 再生に失敗してもキューを止めないよう、この音声だけ飛ばす
+            print(f"Error: {e}", flush=True)
+        finally:
+            if asr is not None:
+                asr.resume()  # 再生終了後にマイクをONにする
+            queue.task_done()
 
 
 async def synthesis_worker(
@@ -31,15 +49,28 @@ async def synthesis_worker(
     """合成キューから順次テキストを取り出して音声合成し、再生キューに投入するワーカー"""
     while True:
         name, text_segment = await synthesis_queue.get()
-        cfg = ai_config[name]
-        if cfg["engine"] is not None:
-            tts = engines[cfg["engine"]]
-            data, sr = await tts.synthesize_async(text_segment, **cfg["config"])
-            await playback_queue.put((data, sr))
-        synthesis_queue.task_done()
+        if name is None:
+            # ターン終了の目印は、そのターンの合成が失敗していても必ず再生キューへ渡す
+            try:
+                await playback_queue.put((None, text_segment))
+            finally:
+                synthesis_queue.task_done()
+            continue
+        try:
+            cfg = ai_config[name]
+            if cfg["engine"] is not None:
+                tts = engines[cfg["engine"]]
+                result = await tts.synthesize_async(text_segment, **cfg["config"])
+                # 合成に失敗した場合（サーバー停止やエラー応答）はテキストのみで続ける
+                if result is not None:
+                    await playback_queue.put(result)
+        except Exception as e:
+            print(f"Error: {e}", flush=True)
+        finally:
+            synthesis_queue.task_done()
 
 
-async def chat_start(cfg: Config):
+async def chat_start(cfg: Config, resume: bool | str = False):
     user_name = cfg.chat.user.name
     ai_names = {f"ai{i}_name": ai["name"] for i, ai in enumerate(cfg.chat.ai)}
     char_names = [ai["name"] for ai in cfg.chat.ai] + [user_name]
@@ -50,6 +81,18 @@ async def chat_start(cfg: Config):
     ]
     llm = ChatOllama(**cfg.ollama)
 
+    # 長期記憶の設定（要約で消えた発言を埋め込みで検索してプロンプトに戻す）
+    recall = None
+    if cfg.chat.recall.enable:
+        from langchain_ollama import OllamaEmbeddings
+        from .recall import Recall
+
+        recall = Recall(
+            OllamaEmbeddings(**cfg.chat.recall.embedding),
+            cfg.chat.recall.path,
+            cfg.chat.recall.top_k,
+        )
+
     # 音声認識の設定
     asr: SpeechToText = None
     if cfg.chat.user.input == "vosk":
@@ -60,6 +103,10 @@ async def chat_start(cfg: Config):
         from .asr.whisper_asr import WhisperASR
 
         asr = WhisperASR(**cfg.whisper, **cfg.webrtcvad)
+    elif cfg.chat.user.input == "whisper_proc":
+        from .asr.process_asr import ProcessASR
+
+        asr = ProcessASR(dict(cfg.whisper), dict(cfg.webrtcvad))
 
     # 音声合成の設定
     engines = {
@@ -71,14 +118,24 @@ async def chat_start(cfg: Config):
     if cfg.chat.user.input == "ai":
         ai_config[user_name] = cfg.chat.user.voice
 
-    # 再生・合成用のグローバルなキューとワーカーを起動
-    playback_queue = asyncio.Queue()
-    synthesis_queue = asyncio.Queue()
-    asyncio.create_task(playback_worker(playback_queue, asr))
-    asyncio.create_task(
-        synthesis_worker(synthesis_queue, playback_queue, engines, ai_config)
+    # AI同士の会話では、再生中に次のターンを先読み生成する
+    pipeline = TurnPipeline(
+        cfg.chat.pipeline.lookahead if cfg.chat.user.input == "ai" else 0
     )
 
+    # 再生・合成用のグローバルなキューとワーカーを起動
+    # 上限付きにして、再生が追いつかないときは合成・生成側を待たせる
+    playback_queue = SizedQueue(maxsize=cfg.chat.queue.playback)
+    synthesis_queue = SizedQueue(maxsize=cfg.chat.queue.synthesis)
+    workers = [
+        asyncio.create_task(playback_worker(playback_queue, asr)),
+        asyncio.create_task(
+            synthesis_worker(synthesis_queue, playback_queue, engines, ai_config)
+        ),
+    ]
+    # ワーカーが止まったら先読み待ちで固まらずにエラーにする
+    pipeline.watch(workers)
+
     print(f"Chat Start: user.input={cfg.chat.user.input}", flush=True)
 
     chara_prompt = "\n".join([f"{ai['name']}\n{ai['character']}" for ai in cfg.chat.ai])
@@ -95,10 +152,105 @@ async def chat_start(cfg: Config):
     turn = cfg.chat.initial_turn.format(user_name=user_name, **ai_names)
     retry_num = 0
 
-    print(f"{turn}: ", end="", flush=True)
     messages += f"{turn}: "
     summary = ""
-    prompt = ""
+
+    async def make_prompt() -> str:
+        """現在の状態から生成用のプロンプトを作る
+
+        長期記憶から想起した発言は、履歴の先頭側をずらしてプロンプトのキャッシュを
+        無駄にしないよう、現在のターンの行の直前に入れる。
+        """
+        prompt = f"[INST]\n{instruct_prompt}\n{summary}\n[/INST]\n"
+        # 話者選択の生成では検索しない
+        if recall is None or not turn:
+            return prompt + messages
+        # 直近の発言に関連する過去の発言を長期記憶から検索
+        query = "\n".join(messages.split("\n")[-cfg.chat.recall.query_lines :])
+        recalled = await asyncio.to_thread(recall.search, query)
+        if cfg.chat.debug:
+            print(f"debug: 想起 {recall.latency * 1000:.1f}ms", flush=True)
+        if not recalled:
+            return prompt + messages
+        memory = "\n".join(["関連する過去の発言:"] + recalled)
+        current = messages.rsplit("\n", 1)[-1]
+        history = messages[: len(messages) - len(current)]
+        return f"{prompt}{history}[INST]{memory}[/INST]\n{current}"
+
+    # 前回の会話ログがあれば、最後のチェックポイントから再開する
+    # 再開しない場合は新しいログファイルに書き、前回のログは残しておく
+    path = None
+    if isinstance(resume, str):
+        path = resume  # ログファイルを指定して再開
+    elif resume:
+        path = SessionLog.latest_path(cfg.chat.session.dir)
+    state = SessionLog.load(path) if path else None
+    if state is None:
+        path = SessionLog.new_path(cfg.chat.session.dir)
+        print(f"{turn}: ", end="", flush=True)
+    else:
+        messages, summary = state["messages"], state["summary"]
+        turn, prev_turn = state["turn"], state["prev_turn"]
+        if summary:
+            print(summary, flush=True)
+        print(messages, end="", flush=True)
+
+        # 最初の生成と同じプロンプトをあらかじめ読み込ませておく
+        warm_llm = ChatOllama(**{**cfg.ollama, "num_predict": 1})
+
+        async def warm_up():
+            try:
+                await asyncio.to_thread(warm_llm.invoke, await make_prompt())
+            except Exception as e:
+                print(f"Error: {e}", flush=True)
+
+        if turn == user_name and cfg.chat.user.input != "ai":
+            # ユーザー入力を待つ間に読み込ませる
+            asyncio.create_task(warm_up())
+        else:
+            # すぐにLLMが生成するので、読み込み終わってから始める
+            await warm_up()
+    session = SessionLog(path)
+    session.checkpoint(messages, summary, turn, prev_turn)
+    asyncio.create_task(session.worker())
+    # バックグラウンドで実行中の要約タスクと、要約開始時点のメッセージ
+    summary_task = None
+    summary_base = ""
+
+    if cfg.chat.memory_report:
+        stages = {
+            "synthesis": lambda: synthesis_queue.nbytes,
+            "playback": lambda: playback_queue.nbytes,
+            "messages": lambda: sys.getsizeof(messages) + sys.getsizeof(summary),
+        }
+        if asr is not None:
+            stages["asr"] = asr.nbytes
+        asyncio.create_task(memory_report_worker(cfg.chat.memory_report, stages))
+
+    def run_summary(messages: str, summary: str) -> tuple[str, str]:
+        """会話を要約し、要約と直近だけ残したメッセージを返す"""
+        print("要約中", flush=True)
+        prompt = f"[INST]\n{instruct_prompt}\n{summary}\n[/INST]\n{messages}"
+        # resp = llm.invoke(f"{messages}\n上記会話を1行で要約してください。\n")
+        resp = llm.invoke(f"{prompt}\n[INST]上記会話を1行で要約してください。[/INST]\n")
+        summary = f"これまでの要約: {resp.content}"
+        print(summary, flush=True)
+        if cfg.chat.debug:
+            print("debug:", summary, flush=True)
+        message_list = messages.split("\n")
+        cut_message_list = message_list[-cfg.chat.summary.tail :]
+        if recall is not None:
+            # 消える発言は長期記憶に保存しておく
+            evicted = message_list[: -cfg.chat.summary.tail]
+            try:
+                recall.add([m for m in evicted if not m.startswith("[INST]")])
+            except Exception as e:
+                # 保存に失敗しても要約による圧縮は続ける
+                print(f"Error: {e}", flush=True)
+        if cfg.chat.debug:
+            print("debug:", len(message_list), "->", len(cut_message_list), flush=True)
+        return summary, "\n".join(cut_message_list)
+
     # チャット全体をループで実行（各ターンごとにユーザー入力とテキスト生成を処理）
     while True:
         # ユーザー入力取得（音声入力の場合は asr.audio_input、テキストの場合は input()）
@@ -108,6 +260,8 @@ async def chat_start(cfg: Config):
             else:
                 user_input = await asyncio.to_thread(asr.audio_input)
                 print(user_input, flush=True)
+                if cfg.chat.debug:
+                    asr.print_stats()
 
             messages += f"{user_input}\n"
             if len(char_names) == 2:
@@ -162,6 +316,8 @@ async def chat_start(cfg: Config):
                     prev_turn = turn
                     turn = None
                 retry_num = 0
+                # このターンの音声を再生し終えたら先読み枠を返す
+                await synthesis_queue.put((None, pipeline.release))
             elif answer in char_names and prev_turn != answer:
                 turn = answer
                 messages += f"{turn}: "
@@ -186,14 +342,22 @@ async def chat_start(cfg: Config):
                 if cfg.chat.debug:
                     print(f"debug: [{retry_num}]", answer, flush=True)
 
+        prompt = await make_prompt()
+
+        # 発話ターンなら先読み枠が空くまで待つ（話者選択の生成は待たない）
+        if turn:
+            await pipeline.acquire()
+            if cfg.chat.debug and pipeline.enabled:
+                print(
+                    f"debug: 先読み {pipeline.pending}/{pipeline.lookahead}", flush=True
+                )
+
         # テキスト処理タスクを開始
         processing_task = asyncio.create_task(process_text_queue())
 
         # 同期の llm.stream() を別スレッドで実行し、その結果を text_queue に投入する
         loop = asyncio.get_running_loop()
 
-        prompt = f"[INST]\n{instruct_prompt}\n{summary}\n[/INST]\n{messages}"
-
         def generate_text():
             for chunk in llm.stream(prompt):
                 asyncio.run_coroutine_threadsafe(text_queue.put(chunk), loop)
@@ -204,26 +368,30 @@ async def chat_start(cfg: Config):
         # テキスト処理タスクが完了するのを待つ
         await processing_task
 
-        def run_summary():
-            nonlocal messages, summary, prompt
-            print("要約中", flush=True)
-            prompt = f"[INST]\n{instruct_prompt}\n{summary}\n[/INST]\n{messages}"
-            # resp = llm.invoke(f"{messages}\n上記会話を1行で要約してください。\n")
-            resp = llm.invoke(
-                f"{prompt}\n[INST]上記会話を1行で要約してください。[/INST]\n"
-            )
-            summary = f"これまでの要約: {resp.content}"
-            print(summary, flush=True)
-            if cfg.chat.debug:
-                print("debug:", summary, flush=True)
-            message_list = messages.split("\n")
-            cut_message_list = message_list[-cfg.chat.summary.tail :]
-            if cfg.chat.debug:
-                print(
-                    "debug:", len(message_list), "->", len(cut_message_list), flush=True
+        # 要約が終わっていれば反映する
+        if summary_task is not None and summary_task.done():
+            try:
+                summary, compacted = summary_task.result()
+                # 要約中に先読みで追加された発話は、圧縮後のメッセージへ付け替える
+                messages = compacted + messages[len(summary_base) :]
+                session.checkpoint(messages, summary, turn, prev_turn)
+            except Exception as e:
+                # 要約に失敗した場合は圧縮せずにそのまま続ける
+                print(f"Error: {e}", flush=True)
+            summary_task = None
+
+        if summary_task is None and len(messages) > cfg.chat.summary.length:
+            if pipeline.enabled:
+                # 要約を待たずに次のターンの生成へ進む
+                summary_base = messages
+                summary_task = asyncio.create_task(
+                    asyncio.to_thread(run_summary, messages, summary)
+                )
+            else:
+                summary, messages = await asyncio.to_thread(
+                    run_summary, messages, summary
                 )
-            messages = "\n".join(cut_message_list)
-            prompt = f"[INST]\n{instruct_prompt}\n{summary}\n[/INST]\n{messages}"
+                session.checkpoint(messages, summary, turn, prev_turn)
 
-        if len(messages) > cfg.chat.summary.length:
-            await asyncio.to_thread(run_summary)
+        # このターンで増えたメッセージをログに追記
+        session.turn(messages, turn, prev_turn)
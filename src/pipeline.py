@@ -0,0 +1,50 @@
+import asyncio
+
+
+class TurnPipeline:
+    """再生中のターンと並行して次のターンを先読み生成するための管理
+
+    発話ターンの生成前に acquire し、そのターンの音声が再生し終わったら release する。
+    先読みできるターン数を lookahead で制限する。
+    """
+
+    def __init__(self, lookahead: int):
+        """
+        Args:
+            lookahead (int): 再生が終わっていないターンを何個まで許すか（0以下で無効）
+        """
+        self.enabled = lookahead > 0
+        self.lookahead = lookahead
+        self.pending = 0  # 生成済みで再生が終わっていないターン数
+        self.semaphore = asyncio.Semaphore(lookahead) if self.enabled else None
+        self.workers: list[asyncio.Task] = []
+
+    def watch(self, workers: list[asyncio.Task]):
+        """release を行うワーカーを登録（止まったら acquire でエラーにする）"""
+        self.workers = workers
+
+    def _check_workers(self):
+        for worker in self.workers:
+            if worker.done():
+                if not worker.cancelled() and worker.exception() is not None:
+                    raise RuntimeError("ワーカーが停止しました") from worker.exception()
+                raise RuntimeError("ワーカーが停止しました")
+
+    async def acquire(self):
+        """先読み枠が空くまで待つ"""
+        if not self.enabled:
+            return
+        self._check_workers()
+        waiter = asyncio.create_task(self.semaphore.acquire())
+        await asyncio.wait([waiter, *self.workers], return_when=asyncio.FIRST_COMPLETED)
+        if not waiter.done():
+            waiter.cancel()
+            self._check_workers()
+        self.pending += 1
+
+    def release(self):
+        """ターンの再生が終わったことを通知"""
+        if not self.enabled:
+            return
+        self.pending -= 1
+        self.semaphore.release()
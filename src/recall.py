@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class VectorIndex:
+    """埋め込みベクトルとテキストを追記型のファイルに保存し、mmapで検索するインデックス
+
+    ベクトルは正規化済みの float32 を {path}.f32 に、テキストは {path}.jsonl に追記し、
+    次元数は {path}.json に保存する。
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): 保存先のパス（拡張子なし）
+        """
+        self.vector_path = f"{path}.f32"
+        self.text_path = f"{path}.jsonl"
+        self.meta_path = f"{path}.json"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.dim = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        self.texts = self._read_texts()
+        self._repair()
+        self.vectors = self._load()
+
+    def _read_texts(self) -> list[str]:
+        """テキストを読み込む（書き込み途中で終了した行は無視する）"""
+        texts = []
+        self.broken = False  # 読めない行があったか
+        if not os.path.exists(self.text_path):
+            return texts
+        with open(self.text_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    texts.append(json.loads(line)["text"])
+                except (json.JSONDecodeError, KeyError):
+                    self.broken = True
+                    break
+        return texts
+
+    def _repair(self):
+        """途中で終了した書き込みを捨て、ベクトルとテキストの件数を揃える"""
+        rows = 0
+        if self.dim and os.path.exists(self.vector_path):
+            rows = os.path.getsize(self.vector_path) // (4 * self.dim)
+        n = min(rows, len(self.texts))
+        vector_bytes = n * 4 * (self.dim or 0)
+        if (
+            os.path.exists(self.vector_path)
+            and os.path.getsize(self.vector_path) != vector_bytes
+        ):
+            with open(self.vector_path, "r+b") as f:
+                f.truncate(vector_bytes)
+        if self.broken or n < len(self.texts):
+            self.texts = self.texts[:n]
+            with open(self.text_path, "w", encoding="utf-8") as f:
+                for text in self.texts:
+                    f.write(json.dumps({"text": text}, ensure_ascii=False) + "\n")
+
+    def _load(self) -> np.ndarray:
+        """ベクトルファイルをmmapで開く"""
+        if not self.texts:
+            return None
+        data = np.memmap(self.vector_path, dtype=np.float32, mode="r")
+        return data.reshape(len(self.texts), self.dim)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def add(self, texts: list[str], vectors: np.ndarray):
+        """テキストと埋め込みベクトルを追加
+
+        Args:
+            texts (list[str]): テキスト
+            vectors (np.ndarray): 埋め込みベクトル (len(texts), 次元数)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim}, f)
+            if self.dim != vectors.shape[1]:
+                raise ValueError(
+                    f"次元数が一致しません: {self.dim} != {vectors.shape[1]}"
+                )
+            with open(self.vector_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self.text_path, "a", encoding="utf-8") as f:
+                for text in texts:
+                    f.write(json.dumps({"text": text}, ensure_ascii=False) + "\n")
+            self.texts.extend(texts)
+            self.vectors = self._load()
+
+    def search(self, vector: np.ndarray, k: int) -> list[str]:
+        """コサイン類似度の高い順にテキストを返す
+
+        Args:
+            vector (np.ndarray): クエリの埋め込みベクトル
+            k (int): 返す件数
+
+        Returns:
+            list[str]: 類似したテキスト
+        """
+        with self.lock:
+            if self.vectors is None:
+                return []
+            vector = np.asarray(vector, dtype=np.float32)
+            scores = self.vectors @ (vector / (np.linalg.norm(vector) + 1e-12))
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [self.texts[i] for i in top]
+
+
+class Recall:
+    """要約で消えた発言を埋め込みで検索し、プロンプトに戻すための長期記憶"""
+
+    def __init__(self, embeddings: Embeddings, path: str, top_k: int):
+        """
+        Args:
+            embeddings (Embeddings): 埋め込みモデル
+            path (str): インデックスの保存先
+            top_k (int): 検索する件数
+        """
+        self.embeddings = embeddings
+        self.index = VectorIndex(path)
+        self.top_k = top_k
+        self.latency = 0.0  # 直近の検索にかかった時間（秒）
+
+    def add(self, texts: list[str]):
+        """発言を埋め込んで保存"""
+        texts = [text for text in texts if text.strip()]
+        if not texts:
+            return
+        self.index.add(texts, self.embeddings.embed_documents(texts))
+
+    def search(self, query: str) -> list[str]:
+        """クエリに関連する過去の発言を検索"""
+        if not len(self.index):
+            return []
+        start = time.perf_counter()
+        result = self.index.search(self.embeddings.embed_query(query), self.top_k)
+        self.latency = time.perf_counter() - start
+        return result
@@ -0,0 +1,117 @@
+import os
+import glob
+import json
+import asyncio
+from datetime import datetime
+
+
+class SessionLog:
+    """会話の状態を追記型のログに保存し、再開時に復元するためのクラス
+
+    会話ごとに新しいログファイルを作り、要約で圧縮したタイミングでチェックポイント（全状態）を、
+    それ以外は各ターンで増えたメッセージの差分だけを追記する。
+    書き込みはワーカーで別スレッドから行い、会話の進行を待たせない。
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): ログファイルのパス
+        """
+        self.path = path
+        self.queue = asyncio.Queue()
+        self.logged = 0  # ログに書き込み済みのメッセージ長
+
+    @staticmethod
+    def new_path(directory: str) -> str:
+        """新しい会話のログファイルのパスを返す"""
+        os.makedirs(directory, exist_ok=True)
+        name = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        return os.path.join(directory, f"{name}.jsonl")
+
+    @staticmethod
+    def latest_path(directory: str) -> str | None:
+        """最も新しい会話のログファイルのパスを返す（なければNone）
+
+        1ターンも進まずに終了した会話のログは飛ばす。
+        """
+        paths = sorted(glob.glob(os.path.join(directory, "*.jsonl")))
+        for path in reversed(paths):
+            if SessionLog._has_turn(path):
+                return path
+        return None
+
+    @staticmethod
+    def _has_turn(path: str) -> bool:
+        """ターンの記録が1つでもあるか"""
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    if json.loads(line)["type"] == "turn":
+                        return True
+                except json.JSONDecodeError:
+                    break
+        return False
+
+    @staticmethod
+    def load(path: str) -> dict | None:
+        """ログから最後の状態を復元する
+
+        Args:
+            path (str): ログファイルのパス
+
+        Returns:
+            dict | None: messages, summary, turn, prev_turn（ログがなければNone）
+        """
+        if not os.path.exists(path):
+            return None
+        state = None
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # 書き込み途中で終了した行は無視する
+                if record["type"] == "checkpoint":
+                    state = {k: v for k, v in record.items() if k != "type"}
+                elif state is not None:
+                    state["messages"] += record["delta"]
+                    state["turn"] = record["turn"]
+                    state["prev_turn"] = record["prev_turn"]
+        return state
+
+    def checkpoint(self, messages: str, summary: str, turn: str, prev_turn: str):
+        """全状態を追記"""
+        self.logged = len(messages)
+        self.queue.put_nowait(
+            {
+                "type": "checkpoint",
+                "messages": messages,
+                "summary": summary,
+                "turn": turn,
+                "prev_turn": prev_turn,
+            }
+        )
+
+    def turn(self, messages: str, turn: str, prev_turn: str):
+        """前回から増えたメッセージを追記"""
+        delta = messages[self.logged :]
+        if not delta:
+            return
+        self.logged = len(messages)
+        self.queue.put_nowait(
+            {"type": "turn", "delta": delta, "turn": turn, "prev_turn": prev_turn}
+        )
+
+    def _write(self, records: list[dict]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    async def worker(self):
+        """キューに溜まった記録をまとめて書き込むワーカー"""
+        while True:
+            records = [await self.queue.get()]
+            while not self.queue.empty():
+                records.append(self.queue.get_nowait())
+            await asyncio.to_thread(self._write, records)
@@ -42,6 +42,7 @@ class TextToSpeech(ABC):
         pass
 
     def _read_wav(self, wav_data: bytes) -> tuple[np.ndarray, int]:
+        # キューに溜まる間のメモリを抑えるため int16 のまま保持し、再生時に float へ変換する
         with io.BytesIO(wav_data) as wav_file:
-            data, sr = sf.read(wav_file, dtype="float32")
+            data, sr = sf.read(wav_file, dtype="int16")
         return data, sr
@@ -3,13 +3,16 @@ from invoke.config import Config
 import asyncio
 
 
-@task
-def chat(c: Config):
+@task(
+    optional=["resume"],
+    help={"resume": "前回の会話ログから再開する（ログファイルのパスも指定可）"},
+)
+def chat(c: Config, resume=None):
     """AIとのチャット"""
     from src.chat import chat_start
 
     # 非同期関数を実行
-    asyncio.run(chat_start(c.config))
+    asyncio.run(chat_start(c.config, resume))
 
 
 @task
@@ -80,9 +83,30 @@ def whisper_test(c: Config, loop: bool = False):
         while True:
             text = asr.audio_input()
             print(text)
+            asr.print_stats()
+    else:
+        text = asr.audio_input()
+        print(text)
+        asr.print_stats()
+
+
+@task
+def whisper_proc_test(c: Config, loop: bool = False):
+    """Whisper(別プロセス)のテスト"""
+    from src.asr.process_asr import ProcessASR
+
+    print("読み取り開始")
+    asr = ProcessASR(dict(c.config.whisper), dict(c.config.webrtcvad))
+    if loop:
+        while True:
+            text = asr.audio_input()
+            print(text)
+            asr.print_stats()
     else:
         text = asr.audio_input()
         print(text)
+        asr.print_stats()
+    asr.close()
 
 
 @task